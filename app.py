@@ -1,36 +1,112 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import orjson
 from flask import Flask, render_template, request, jsonify
 from flask_cors import CORS
 from bug_detector import BugDetector
 from ml_models import MLBugDetector
+from code_cache import content_digest
+
+# Salts every /analyze ETag: bump it whenever detector output changes, or
+# clients holding old tags keep getting 304s for stale results
+VERSION = '1.1.0'
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['ETag'])
 
 bug_detector = BugDetector()
 ml_detector = MLBugDetector()
 
+# CPU-bound analysis runs in a process pool so it never holds the request
+# thread's GIL. The pool is created on first use: executors do not survive a
+# fork, and gunicorn preloads this module in the master before forking. Pool
+# processes are started through a forkserver rather than forked from this
+# (multi-threaded) worker, falling back to spawn where forkserver is not
+# available (Windows).
+#
+# Scaling across cores comes from gunicorn's worker count, so each worker gets
+# a single analyzer process by default (ANALYZER_WORKERS overrides it). The
+# detectors' result caches live in the pool processes, so a repeat submission
+# only hits the cache when it reaches the same gunicorn worker; a bigger pool
+# splits the cache further.
+analyzer_pool = None
+analyzer_pool_lock = threading.Lock()
+ANALYZER_START_METHOD = (
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+def get_analyzer_pool() -> ProcessPoolExecutor:
+    """Return this process's analyzer pool, creating it on first use"""
+    global analyzer_pool
+    with analyzer_pool_lock:
+        if analyzer_pool is None:
+            max_workers = int(os.environ.get('ANALYZER_WORKERS', 1))
+            analyzer_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context(ANALYZER_START_METHOD)
+            )
+    return analyzer_pool
+
+def discard_analyzer_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool so the next request builds a fresh one"""
+    global analyzer_pool
+    with analyzer_pool_lock:
+        if analyzer_pool is pool:
+            analyzer_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _analysis_etag(code, language, use_ml) -> str:
+    """ETag for an /analyze response, covering every input that shapes it"""
+    return content_digest(f'{VERSION}\0{language.lower()}\0{bool(use_ml)}\0{code}').hex()
+
+def _analyze_worker(code, language, use_ml):
+    """Run rule-based and ML detection inside an analyzer pool process"""
+    # Rule-based detection
+    results = bug_detector.analyze_code(code, language)
+    
+    # ML-based detection
+    if use_ml:
+        ml_results = ml_detector.analyze_with_ml(code)
+        results['ml_insights'] = ml_results.get('ml_insights', [])
+        results['confidence_score'] = ml_results.get('confidence_score', 0.0)
+    
+    return results
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/analyze', methods=['POST'])
-def analyze():
+async def analyze():
     try:
         data = request.get_json()
         code = data.get('code', '')
         language = data.get('language', 'python')
+        use_ml = data.get('use_ml', True)
         
         if not code.strip():
             return jsonify({'error': 'No code provided'}), 400
         
-        # Rule-based detection
-        results = bug_detector.analyze_code(code, language)
+        # Editors resubmit unchanged code constantly; let them revalidate
+        etag = _analysis_etag(code, language, use_ml)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
         
-        # ML-based detection
-        if data.get('use_ml', True):
-            ml_results = ml_detector.analyze_with_ml(code)
-            results['ml_insights'] = ml_results.get('ml_insights', [])
-            results['confidence_score'] = ml_results.get('confidence_score', 0.0)
+        loop = asyncio.get_running_loop()
+        pool = get_analyzer_pool()
+        try:
+            results = await loop.run_in_executor(pool, _analyze_worker, code, language, use_ml)
+        except BrokenProcessPool:
+            # A pool process died (e.g. OOM-killed); every later submit to
+            # this pool would fail too
+            discard_analyzer_pool(pool)
+            raise
         
         # Statistics
         total_issues = (
@@ -40,19 +116,22 @@ def analyze():
         )
         
         results['total_issues'] = total_issues
-        results['lines_analyzed'] = len(code.split('\n'))
+        results['lines_analyzed'] = code.count('\n') + 1
         
-        return jsonify(results)
+        response = app.response_class(orjson.dumps(results), mimetype='application/json')
+        response.set_etag(etag)
+        return response
     
     except Exception as e:
         return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'healthy', 'version': '1.0.0'})
+    return jsonify({'status': 'healthy', 'version': VERSION})
 
 if __name__ == '__main__':
     print("🚀 Starting AI Bug Detection System...")
     print("📊 Based on research: GRU+CNN, NLP, and ML techniques")
     print("🌐 Open: http://localhost:5000")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    print("⚠️  Development server only - serve with `gunicorn app:app` in production")
+    app.run(host='0.0.0.0', port=5000)
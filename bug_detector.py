@@ -1,30 +1,208 @@
 import ast
+import copy
+import functools
 import re
 from typing import List, Dict
-import astroid
+import numpy as np
+from code_cache import SourceKey
 
-class BugDetector:
-    """Core bug detection engine using AST analysis"""
+# JavaScript antipatterns, matched once over the whole encoded buffer
+_JS_LOOSE_EQ = re.compile(rb'(?<![=!])==(?!=)')
+# \b alone is ASCII-only on bytes, so UTF-8 bytes of identifiers like 'ñvar'
+# would count as boundaries
+_JS_VAR = re.compile(rb'(?<![\w\x80-\xff])var(?![\w\x80-\xff])')
+
+# Unresolved work markers, for languages without a dedicated analyzer
+_TODO_MARKER = re.compile(rb'TODO|FIXME')
+
+@functools.lru_cache(maxsize=512)
+def _cached_analysis(source: SourceKey, language: str) -> Dict:
+    """Analyze each distinct (source, language) pair only once"""
+    if language == 'python':
+        return BugDetector._analyze_python(source.code)
+    elif language in ['javascript', 'js']:
+        return BugDetector._analyze_javascript(source.code)
+    else:
+        return BugDetector._analyze_generic(source.code)
+
+def _line_index(code: str):
+    """Encode a snippet once and locate its newlines, for all line-based scans"""
+    buf = code.encode()
+    newlines = np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) == 10)
+    return buf, newlines
+
+def _match_lines(pattern, buf: bytes, newlines) -> set:
+    """1-based line numbers of every line of buf containing a match of pattern"""
+    offsets = [match.start() for match in pattern.finditer(buf)]
+    if not offsets:
+        return set()
+    return set((np.searchsorted(newlines, offsets) + 1).tolist())
+
+class _DetectorVisitor:
+    """Single-pass visitor that feeds every Python detector
+    
+    The walk keeps an explicit stack instead of recursing like
+    ast.NodeVisitor, so deeply nested expressions that ast.parse accepts
+    cannot overflow the interpreter's recursion limit. visit_* methods only
+    inspect their node; walk() pushes the children.
+    """
     
     def __init__(self):
-        self.syntax_errors = []
-        self.logical_bugs = []
-        self.antipatterns = []
+        self.mutable_defaults = []
+        self.division_by_zero = []
+        self.unreachable_code = []
+        self.empty_except = []
+        self.defined_vars = {}  # name -> line of first assignment
+        self.used_vars = set()
+        self.functions = []  # return bookkeeping per function, in source order
+        self._function = None  # record of the innermost enclosing function
+    
+    def walk(self, tree: ast.AST):
+        """Visit every node of tree in pre-order"""
+        # Each entry carries the record of its innermost enclosing function
+        stack = [(tree, None)]
+        while stack:
+            node, self._function = stack.pop()
+            visitor = getattr(self, 'visit_' + node.__class__.__name__, None)
+            if visitor is not None:
+                visitor(node)
+            
+            # Push children reversed so they are popped in source order
+            children = list(ast.iter_child_nodes(node))
+            stack.extend((child, self._function) for child in reversed(children))
+    
+    def _define(self, name: str, line: int):
+        """Record an assigned name; underscore-prefixed names are exempt"""
+        if not name.startswith('_'):
+            self.defined_vars.setdefault(name, line)
+    
+    def visit_Name(self, node):
+        if node.ctx.__class__ is ast.Store:
+            self._define(node.id, node.lineno)
+        elif node.ctx.__class__ is ast.Load:
+            self.used_vars.add(node.id)
+    
+    def visit_arguments(self, node):
+        # *args and **kwargs are not counted as variables
+        for arg in node.posonlyargs + node.args + node.kwonlyargs:
+            self._define(arg.arg, arg.lineno)
+    
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self._define(node.name, node.lineno)
+    
+    # Pattern captures are plain strings, not Name nodes
+    def visit_MatchAs(self, node):
+        if node.name:
+            self._define(node.name, node.lineno)
+    
+    visit_MatchStar = visit_MatchAs
+    
+    def visit_MatchMapping(self, node):
+        if node.rest:
+            self._define(node.rest, node.lineno)
+    
+    @staticmethod
+    def _def_line(node) -> int:
+        """Line a definition is reported at: its first decorator, if any"""
+        return node.decorator_list[0].lineno if node.decorator_list else node.lineno
+    
+    def visit_FunctionDef(self, node):
+        # Mutable default arguments
+        for default in node.args.defaults:
+            if default.__class__ is ast.List or default.__class__ is ast.Dict:
+                self.mutable_defaults.append({
+                    'line': self._def_line(node),
+                    'message': f"Mutable default argument in '{node.name}' - can cause bugs",
+                    'severity': 'high'
+                })
+        
+        # Unreachable code after return; a final return has nothing after it
+        for stmt_idx, stmt in enumerate(node.body[:-1]):
+            if stmt.__class__ is ast.Return:
+                self.unreachable_code.append({
+                    'line': node.body[stmt_idx + 1].lineno,
+                    'message': "Unreachable code after return",
+                    'severity': 'medium'
+                })
+                break
+        
+        # Returns inside the body are recorded as the walk reaches them
+        self._function = {'node': node, 'has_return': False, 'has_return_value': False}
+        self.functions.append(self._function)
+    
+    visit_AsyncFunctionDef = visit_FunctionDef
+    
+    def visit_Return(self, node):
+        if self._function is not None:
+            self._function['has_return'] = True
+            if node.value is not None:
+                self._function['has_return_value'] = True
+    
+    def visit_BinOp(self, node):
+        if node.op.__class__ in (ast.Div, ast.FloorDiv, ast.Mod):
+            if node.right.__class__ is ast.Constant and node.right.value == 0:
+                self.division_by_zero.append({
+                    'line': node.lineno,
+                    'message': "Division by zero detected",
+                    'severity': 'critical'
+                })
+    
+    def visit_Try(self, node):
+        for handler in node.handlers:
+            if not handler.body or (len(handler.body) == 1 and handler.body[0].__class__ is ast.Pass):
+                self.empty_except.append({
+                    'line': handler.lineno,
+                    'message': "Empty except block - exceptions silently ignored",
+                    'severity': 'medium'
+                })
+    
+    visit_TryStar = visit_Try
+    
+    def findings(self) -> Dict[str, List[Dict]]:
+        """Detector results, grouped and ordered as in the API response"""
+        missing_return = []
+        for function in self.functions:
+            node = function['node']
+            if node.name.startswith('_'):
+                continue
+            # A docstring is not a statement of the body
+            body_len = len(node.body) - (ast.get_docstring(node, clean=False) is not None)
+            if function['has_return'] and not function['has_return_value'] and body_len > 1:
+                missing_return.append({
+                    'line': self._def_line(node),
+                    'message': f"Function '{node.name}' has return without value",
+                    'severity': 'medium'
+                })
+        
+        unused_vars = []
+        unused = self.defined_vars.keys() - self.used_vars
+        for var_name in sorted(unused, key=lambda name: (self.defined_vars[name], name)):
+            unused_vars.append({
+                'line': self.defined_vars[var_name],
+                'message': f"Unused variable: '{var_name}'",
+                'severity': 'low'
+            })
         
+        return {
+            'logical_bugs': self.mutable_defaults + self.division_by_zero + missing_return,
+            'antipatterns': unused_vars + self.unreachable_code + self.empty_except
+        }
+
+class BugDetector:
+    """Core bug detection engine using AST analysis
+    
+    Detectors keep no per-request state, so one instance can serve
+    concurrent requests.
+    """
+    
     def analyze_code(self, code: str, language: str = 'python') -> Dict:
         """Main analysis function"""
-        self.syntax_errors = []
-        self.logical_bugs = []
-        self.antipatterns = []
-        
-        if language.lower() == 'python':
-            return self._analyze_python(code)
-        elif language.lower() in ['javascript', 'js']:
-            return self._analyze_javascript(code)
-        else:
-            return self._analyze_generic(code)
-    
-    def _analyze_python(self, code: str) -> Dict:
+        # Cached results are shared between callers, so hand out a copy
+        return copy.deepcopy(_cached_analysis(SourceKey(code), language.lower()))
+    
+    @classmethod
+    def _analyze_python(cls, code: str) -> Dict:
         """Analyze Python code for bugs"""
         results = {
             'syntax_errors': [],
@@ -35,10 +213,10 @@ class BugDetector:
         
         # Syntax Error Detection
         try:
-            ast.parse(code)
+            tree = ast.parse(code)
         except SyntaxError as e:
             results['syntax_errors'].append({
-                'line': e.lineno,
+                'line': e.lineno or 1,
                 'message': f"Syntax Error: {e.msg}",
                 'severity': 'critical'
             })
@@ -46,25 +224,9 @@ class BugDetector:
             return results
         
         # AST-based analysis
-        try:
-            tree = astroid.parse(code)
-            
-            # Detect logical bugs
-            results['logical_bugs'].extend(self._detect_mutable_defaults(tree))
-            results['logical_bugs'].extend(self._detect_division_by_zero(tree))
-            results['logical_bugs'].extend(self._detect_missing_return(tree))
-            
-            # Detect antipatterns
-            results['antipatterns'].extend(self._detect_unused_vars(tree))
-            results['antipatterns'].extend(self._detect_unreachable_code(tree))
-            results['antipatterns'].extend(self._detect_empty_except(tree))
-            
-        except Exception as e:
-            results['syntax_errors'].append({
-                'line': 1,
-                'message': f"Analysis Error: {str(e)}",
-                'severity': 'medium'
-            })
+        findings = cls._collect(tree)
+        results['logical_bugs'].extend(findings['logical_bugs'])
+        results['antipatterns'].extend(findings['antipatterns'])
         
         # Determine overall severity
         if results['syntax_errors']:
@@ -76,112 +238,15 @@ class BugDetector:
         
         return results
     
-    def _detect_unused_vars(self, tree) -> List[Dict]:
-        """Detect unused variables"""
-        antipatterns = []
-        defined_vars = set()
-        used_vars = set()
-        
-        for node in tree.nodes_of_class(astroid.AssignName):
-            if not node.name.startswith('_'):
-                defined_vars.add((node.name, node.lineno))
-        
-        for node in tree.nodes_of_class(astroid.Name):
-            used_vars.add(node.name)
-        
-        for var_name, line in defined_vars:
-            if var_name not in used_vars:
-                antipatterns.append({
-                    'line': line,
-                    'message': f"Unused variable: '{var_name}'",
-                    'severity': 'low'
-                })
-        
-        return antipatterns
-    
-    def _detect_mutable_defaults(self, tree) -> List[Dict]:
-        """Detect mutable default arguments"""
-        bugs = []
-        for node in tree.nodes_of_class(astroid.FunctionDef):
-            if node.args.defaults:
-                for default in node.args.defaults:
-                    if isinstance(default, (astroid.List, astroid.Dict)):
-                        bugs.append({
-                            'line': node.lineno,
-                            'message': f"Mutable default argument in '{node.name}' - can cause bugs",
-                            'severity': 'high'
-                        })
-        return bugs
-    
-    def _detect_division_by_zero(self, tree) -> List[Dict]:
-        """Detect potential division by zero"""
-        bugs = []
-        for node in tree.nodes_of_class(astroid.BinOp):
-            if node.op in ['/', '//', '%']:
-                if isinstance(node.right, astroid.Const) and node.right.value == 0:
-                    bugs.append({
-                        'line': node.lineno,
-                        'message': "Division by zero detected",
-                        'severity': 'critical'
-                    })
-        return bugs
-    
-    def _detect_unreachable_code(self, tree) -> List[Dict]:
-        """Detect unreachable code after return"""
-        antipatterns = []
-        for node in tree.nodes_of_class(astroid.FunctionDef):
-            try:
-                for stmt_idx, stmt in enumerate(node.body):
-                    if isinstance(stmt, astroid.Return):
-                        if stmt_idx < len(node.body) - 1:
-                            antipatterns.append({
-                                'line': node.body[stmt_idx + 1].lineno,
-                                'message': "Unreachable code after return",
-                                'severity': 'medium'
-                            })
-                            break
-            except:
-                pass
-        return antipatterns
-    
-    def _detect_empty_except(self, tree) -> List[Dict]:
-        """Detect empty except blocks"""
-        antipatterns = []
-        for node in tree.nodes_of_class(astroid.TryExcept):
-            for handler in node.handlers:
-                if not handler.body or (len(handler.body) == 1 and isinstance(handler.body[0], astroid.Pass)):
-                    antipatterns.append({
-                        'line': handler.lineno,
-                        'message': "Empty except block - exceptions silently ignored",
-                        'severity': 'medium'
-                    })
-        return antipatterns
-    
-    def _detect_missing_return(self, tree) -> List[Dict]:
-        """Detect functions with inconsistent returns"""
-        bugs = []
-        for node in tree.nodes_of_class(astroid.FunctionDef):
-            if node.name.startswith('_'):
-                continue
-            
-            has_return = False
-            has_return_value = False
-            
-            for child in node.nodes_of_class(astroid.Return):
-                has_return = True
-                if child.value is not None:
-                    has_return_value = True
-            
-            if has_return and not has_return_value and len(node.body) > 1:
-                bugs.append({
-                    'line': node.lineno,
-                    'message': f"Function '{node.name}' has return without value",
-                    'severity': 'medium'
-                })
-        
-        return bugs
+    @staticmethod
+    def _collect(tree: ast.Module) -> Dict[str, List[Dict]]:
+        """Run every Python detector in a single walk of the tree"""
+        visitor = _DetectorVisitor()
+        visitor.walk(tree)
+        return visitor.findings()
     
-    def _analyze_javascript(self, code: str) -> Dict:
+    @staticmethod
+    def _analyze_javascript(code: str) -> Dict:
         """Basic JavaScript analysis"""
         results = {
             'syntax_errors': [],
@@ -190,17 +255,19 @@ class BugDetector:
             'severity': 'low'
         }
         
-        lines = code.split('\n')
+        buf, newlines = _line_index(code)
+        loose_eq_lines = _match_lines(_JS_LOOSE_EQ, buf, newlines)
+        var_lines = _match_lines(_JS_VAR, buf, newlines)
         
-        for i, line in enumerate(lines, 1):
-            if '==' in line and '===' not in line:
+        for i in sorted(loose_eq_lines | var_lines):
+            if i in loose_eq_lines:
                 results['antipatterns'].append({
                     'line': i,
                     'message': "Use '===' instead of '=='",
                     'severity': 'low'
                 })
             
-            if re.search(r'\bvar\b', line):
+            if i in var_lines:
                 results['antipatterns'].append({
                     'line': i,
                     'message': "Use 'let' or 'const' instead of 'var'",
@@ -212,7 +279,8 @@ class BugDetector:
         
         return results
     
-    def _analyze_generic(self, code: str) -> Dict:
+    @staticmethod
+    def _analyze_generic(code: str) -> Dict:
         """Generic code analysis"""
         results = {
             'syntax_errors': [],
@@ -221,14 +289,13 @@ class BugDetector:
             'severity': 'low'
         }
         
-        lines = code.split('\n')
+        buf, newlines = _line_index(code)
         
-        for i, line in enumerate(lines, 1):
-            if 'TODO' in line or 'FIXME' in line:
-                results['antipatterns'].append({
-                    'line': i,
-                    'message': "Unresolved TODO/FIXME comment",
-                    'severity': 'low'
-                })
+        for i in sorted(_match_lines(_TODO_MARKER, buf, newlines)):
+            results['antipatterns'].append({
+                'line': i,
+                'message': "Unresolved TODO/FIXME comment",
+                'severity': 'low'
+            })
         
         return results
@@ -0,0 +1,22 @@
+import hashlib
+
+
+def content_digest(code: str) -> bytes:
+    """128-bit BLAKE2b digest of a source snippet"""
+    return hashlib.blake2b(code.encode(), digest_size=16).digest()
+
+
+class SourceKey:
+    """Hashable cache key that compares snippets by digest instead of by text"""
+
+    __slots__ = ('code', 'digest')
+
+    def __init__(self, code: str):
+        self.code = code
+        self.digest = content_digest(code)
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __eq__(self, other):
+        return isinstance(other, SourceKey) and self.digest == other.digest
@@ -0,0 +1,16 @@
+import multiprocessing
+
+# Production entrypoint: gunicorn app:app (this file is picked up automatically)
+bind = '0.0.0.0:5000'
+
+# Each worker hands analysis to its own single-process analyzer pool
+# (ANALYZER_WORKERS, default 1), so one worker per core gives one CPU-bound
+# analyzer process per core. Worker threads only wait on that pool; the extra
+# threads queue concurrent /analyze requests and keep / and /health responsive
+# while an analysis runs.
+workers = multiprocessing.cpu_count()
+worker_class = 'gthread'
+threads = 4
+
+# Import the app (and build the detectors) once in the master, then fork
+preload_app = True
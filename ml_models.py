@@ -1,26 +1,109 @@
-from transformers import pipeline
-import torch
+import functools
+import re
+import threading
 from typing import Dict
+import numpy as np
+from code_cache import SourceKey
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+_KEYWORDS = ('if', 'elif', 'else', 'for', 'while', 'and', 'or', 'try', 'except')
+
+# Branching keywords delimited by (ASCII) whitespace, matched in one pass
+_CC_RE = re.compile(r'(?:^|\s)(?:' + '|'.join(_KEYWORDS) + r')(?=\s)', re.ASCII)
+
+# Keywords packed big-endian into integers so the JIT scanner compares whole
+# words with a single integer compare (Numba folds these globals to constants)
+(_KW_IF, _KW_ELIF, _KW_ELSE, _KW_FOR, _KW_WHILE,
+ _KW_AND, _KW_OR, _KW_TRY, _KW_EXCEPT) = (int.from_bytes(kw.encode(), 'big') for kw in _KEYWORDS)
+_KW_MAX_LEN = max(len(kw) for kw in _KEYWORDS)
+
+# Every keyword hit takes at least 3 characters (two letters plus trailing
+# whitespace), so shorter snippets have at most 4 hits and always score Low
+_ALWAYS_LOW_LEN = 15
+
+def _count_keywords(buf) -> int:
+    """Count keywords in a uint8 source buffer; same matches as _CC_RE"""
+    count = 0
+    n = buf.shape[0]
+    i = 0
+    while i < n:
+        # A keyword starts the buffer or follows whitespace
+        if i > 0:
+            prev = buf[i - 1]
+            if not (prev == 32 or 9 <= prev <= 13):
+                i += 1
+                continue
+        
+        # Pack the lowercase word starting here (one byte past the longest
+        # keyword is enough to rule out longer words)
+        j = i
+        packed = 0
+        while j < n and j - i <= _KW_MAX_LEN and 97 <= buf[j] <= 122:
+            packed = (packed << 8) | buf[j]
+            j += 1
+        
+        if j == i:
+            i += 1
+            continue
+        
+        # ...and is followed by whitespace
+        if j < n and (buf[j] == 32 or 9 <= buf[j] <= 13):
+            count += ((packed == _KW_IF) | (packed == _KW_ELIF) | (packed == _KW_ELSE)
+                      | (packed == _KW_FOR) | (packed == _KW_WHILE) | (packed == _KW_AND)
+                      | (packed == _KW_OR) | (packed == _KW_TRY) | (packed == _KW_EXCEPT))
+        i = j
+    
+    return count
+
+if njit is not None:
+    _count_keywords = njit(cache=True)(_count_keywords)
+    # Compile (or load the on-disk cache) at import rather than on first request
+    _count_keywords(np.frombuffer(b'if ', dtype=np.uint8))
+
+@functools.lru_cache(maxsize=512)
+def _cached_complexity(source: SourceKey) -> int:
+    """Cyclomatic complexity, computed once per distinct source"""
+    if njit is None:
+        return 1 + len(_CC_RE.findall(source.code))
+    return 1 + int(_count_keywords(np.frombuffer(source.code.encode(), dtype=np.uint8)))
 
 class MLBugDetector:
     """ML-based detection using CodeBERT (Microsoft Research)"""
     
     def __init__(self):
-        self.device = 0 if torch.cuda.is_available() else -1
+        self.device = -1
         self.initialized = False
+        self._init_attempted = False
+        self._init_lock = threading.Lock()
         
     def initialize_model(self):
-        """Lazy load ML model"""
-        if not self.initialized:
-            try:
-                self.classifier = pipeline(
-                    "text-classification",
-                    model="microsoft/codebert-base",
-                    device=self.device
-                )
-                self.initialized = True
-            except:
-                self.initialized = False
+        """Lazy load ML model; a failed load is not retried until restart"""
+        # Loading takes seconds, so concurrent callers return straight away
+        # (without a model) instead of queueing behind the first attempt
+        with self._init_lock:
+            if self._init_attempted:
+                return
+            self._init_attempted = True
+        
+        try:
+            # torch and transformers take seconds to import, so only pay
+            # for them once the model is actually needed
+            import torch
+            from transformers import pipeline
+            
+            self.device = 0 if torch.cuda.is_available() else -1
+            self.classifier = pipeline(
+                "text-classification",
+                model="microsoft/codebert-base",
+                device=self.device
+            )
+            self.initialized = True
+        except Exception:
+            self.initialized = False
     
     def analyze_with_ml(self, code: str) -> Dict:
         """ML analysis with complexity scoring"""
@@ -29,31 +112,23 @@ class MLBugDetector:
             'confidence_score': 0.0
         }
         
-        try:
+        # Tiny snippets (e.g. autosave pings) cannot reach Medium, so skip
+        # hashing and scanning them
+        if len(code) < _ALWAYS_LOW_LEN:
+            level = 'Low'
+        else:
             complexity = self._calculate_complexity(code)
-            
-            results['ml_insights'].append({
-                'message': f"Code complexity: {'High' if complexity > 10 else 'Medium' if complexity > 5 else 'Low'}",
-                'confidence': 0.85
-            })
-            
-            results['confidence_score'] = 0.85
-            
-        except Exception as e:
-            results['ml_insights'].append({
-                'message': f'ML analysis unavailable',
-                'confidence': 0.0
-            })
+            level = 'High' if complexity > 10 else 'Medium' if complexity > 5 else 'Low'
+        
+        results['ml_insights'].append({
+            'message': f"Code complexity: {level}",
+            'confidence': 0.85
+        })
+        
+        results['confidence_score'] = 0.85
         
         return results
     
     def _calculate_complexity(self, code: str) -> int:
         """Calculate cyclomatic complexity"""
-        complexity = 1
-        keywords = ['if', 'elif', 'else', 'for', 'while', 'and', 'or', 'try', 'except']
-        
-        for keyword in keywords:
-            complexity += code.count(f' {keyword} ')
-            complexity += code.count(f'\n{keyword} ')
-        
-        return complexity
+        return _cached_complexity(SourceKey(code))
@@ -0,0 +1,15 @@
+from bug_detector import BugDetector
+
+
+def _var_lines(code):
+    results = BugDetector().analyze_code(code, 'javascript')
+    return [issue['line'] for issue in results['antipatterns']
+            if issue['message'] == "Use 'let' or 'const' instead of 'var'"]
+
+
+def test_var_declaration_is_flagged():
+    assert _var_lines("let a = 1;\nvar b = 2;\n") == [2]
+
+
+def test_var_inside_non_ascii_identifier_is_not_flagged():
+    assert _var_lines("const ñvar = 1;\nlet varñ = 2;\névar x\n") == []